@@ -4,54 +4,127 @@ Main deal finder for Milwaukee area stores
 Scrapes deals and matches them to your shopping list
 """
 
-import json
+import orjson
 import csv
 import asyncio
+import heapq
+import io
 import aiohttp
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
 from datetime import datetime, timedelta
 from pathlib import Path
 import os
-from typing import Dict, List, Tuple
+import pickle
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import logging
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Setup logging, unless the importing application already has
+if not logging.getLogger().handlers:
+    logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Column types for shopping_list.csv
+SHOPPING_LIST_DTYPES = {
+    'item_name': 'string',
+    'quantity': 'int32',
+    'preferred_brand': 'string',
+    'max_price': 'float64'
+}
+
+# Defaults for optional shopping list columns, keyed by record field
+SHOPPING_LIST_DEFAULTS = {
+    'item': '',
+    'quantity': 1,
+    'preferred_brand': '',
+    'max_price': 999.0
+}
+
+# Minimum fuzzy-match score (0-100) for a deal to count as a shopping list item
+MATCH_SCORE_CUTOFF = 80
+
+# Store scrapers keyed by their stores_config.json key, in dispatch order
+_SCRAPERS: Dict[str, Callable[..., Awaitable[List[Dict]]]] = {}
+
+def register_scraper(store_key: str):
+    """Register a scraper coroutine for a store in stores_config.json"""
+    def decorator(fn):
+        _SCRAPERS[store_key] = fn
+        return fn
+    return decorator
+
 class MilwaukeeDealFinder:
+    BASE_DIR = Path(__file__).resolve().parent.parent
+    STORES_CONFIG = BASE_DIR / "data" / "stores_config.json"
+    SHOPPING_CSV = BASE_DIR / "data" / "shopping_list.csv"
+    CACHE_DIR = BASE_DIR / ".cache"
+    OUTPUT_DIR = BASE_DIR / "output"
+    
     def __init__(self):
-        self.base_dir = Path(__file__).parent.parent
         self.stores_config = self.load_stores_config()
         self.shopping_list = self.load_shopping_list()
         self.deals = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+    def _load_cached(self, path: Path, loader: Callable[[], Any]) -> Any:
+        """Return loader() result, cached on disk until path's mtime changes"""
+        cache_path = self.CACHE_DIR / f"{path.name}.{path.stat().st_mtime_ns}.pkl"
         
+        if cache_path.exists():
+            # A truncated file or one pickled by other library versions is
+            # rebuilt from the source instead
+            try:
+                with open(cache_path, 'rb') as f:
+                    return pickle.load(f)
+            except (pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError) as e:
+                logger.warning("Ignoring unreadable cache %s: %s", cache_path.name, e)
+        
+        result = loader()
+        
+        # Sweep cache entries for older versions of this file
+        self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for stale in self.CACHE_DIR.glob(f"{path.name}.*.pkl"):
+            stale.unlink(missing_ok=True)
+        
+        # Write to a temp file and swap it in, so a killed run can't leave a
+        # partial pickle under the current mtime
+        with tempfile.NamedTemporaryFile('wb', dir=self.CACHE_DIR, suffix='.tmp', delete=False) as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, cache_path)
+        
+        return result
+    
     def load_stores_config(self) -> dict:
         """Load store configuration"""
-        config_path = self.base_dir / "data" / "stores_config.json"
-        with open(config_path, 'r') as f:
-            return json.load(f)
+        return self._load_cached(self.STORES_CONFIG, lambda: orjson.loads(self.STORES_CONFIG.read_bytes()))
     
     def load_shopping_list(self) -> List[Dict]:
         """Load user's shopping list"""
-        list_path = self.base_dir / "data" / "shopping_list.csv"
-        shopping_list = []
+        list_path = self.SHOPPING_CSV
         
         if list_path.exists():
-            with open(list_path, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    shopping_list.append({
-                        'item': row['item_name'],
-                        'quantity': int(row.get('quantity', 1)),
-                        'preferred_brand': row.get('preferred_brand', ''),
-                        'max_price': float(row.get('max_price', 999))
-                    })
+            self.shopping_list_df = self._load_cached(list_path, lambda: self._read_shopping_list(list_path))
         else:
             # Create sample shopping list if none exists
             logger.info("Creating sample shopping list...")
             self.create_sample_shopping_list(list_path)
+            self.shopping_list_df = pd.DataFrame(columns=list(SHOPPING_LIST_DEFAULTS))
+        
+        return self.shopping_list_df.to_dict('records')
+    
+    def _read_shopping_list(self, list_path: Path) -> pd.DataFrame:
+        """Parse the shopping list CSV into a typed DataFrame"""
+        df = pd.read_csv(list_path, dtype=SHOPPING_LIST_DTYPES, na_filter=False)
+        df = df.rename(columns={'item_name': 'item'})
+        
+        # Optional columns fall back to the same defaults as a blank list entry
+        for column, default in SHOPPING_LIST_DEFAULTS.items():
+            if column not in df:
+                df[column] = default
         
-        return shopping_list
+        return df[list(SHOPPING_LIST_DEFAULTS)]
     
     def create_sample_shopping_list(self, path: Path):
         """Create a sample shopping list for new users"""
@@ -74,15 +147,18 @@ class MilwaukeeDealFinder:
             ['Butter', '1', 'Land O\'Lakes', '5.99']
         ]
         
+        buf = io.StringIO()
+        csv.writer(buf).writerows(sample_items)
+        
         path.parent.mkdir(parents=True, exist_ok=True)
-        with open(path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(sample_items)
+        path.write_text(buf.getvalue(), newline='')
     
-    async def scrape_metro_market(self) -> List[Dict]:
+    @register_scraper('metro_market')
+    async def scrape_metro_market(self, session: aiohttp.ClientSession) -> List[Dict]:
         """Scrape deals from Metro Market"""
         deals = []
-        # This would normally scrape the actual website
+        # This would normally scrape the actual website using the shared
+        # session, e.g. `async with session.get(url) as resp`
         # For demo purposes, returning sample deals
         sample_deals = [
             {'item': 'Milk', 'price': 3.49, 'unit': 'gallon', 'brand': 'Kemps', 'valid_until': '2024-01-21'},
@@ -94,10 +170,11 @@ class MilwaukeeDealFinder:
             deal['store'] = 'Metro Market'
             deal['location_id'] = 'mm_shorewood'
         
-        logger.info(f"Found {len(sample_deals)} deals at Metro Market")
+        logger.info("Found %d deals at Metro Market", len(sample_deals))
         return sample_deals
     
-    async def scrape_sendiks(self) -> List[Dict]:
+    @register_scraper('sendiks')
+    async def scrape_sendiks(self, session: aiohttp.ClientSession) -> List[Dict]:
         """Scrape deals from Sendik's"""
         deals = []
         sample_deals = [
@@ -110,10 +187,11 @@ class MilwaukeeDealFinder:
             deal['store'] = "Sendik's"
             deal['location_id'] = 'sendiks_whitefish_bay'
         
-        logger.info(f"Found {len(sample_deals)} deals at Sendik's")
+        logger.info("Found %d deals at Sendik's", len(sample_deals))
         return sample_deals
     
-    async def scrape_walmart(self) -> List[Dict]:
+    @register_scraper('walmart')
+    async def scrape_walmart(self, session: aiohttp.ClientSession) -> List[Dict]:
         """Scrape deals from Walmart using API or web scraping"""
         deals = []
         sample_deals = [
@@ -126,10 +204,11 @@ class MilwaukeeDealFinder:
             deal['store'] = 'Walmart'
             deal['location_id'] = 'walmart_brown_deer'
         
-        logger.info(f"Found {len(sample_deals)} deals at Walmart")
+        logger.info("Found %d deals at Walmart", len(sample_deals))
         return sample_deals
     
-    async def scrape_pick_n_save(self) -> List[Dict]:
+    @register_scraper('pick_n_save')
+    async def scrape_pick_n_save(self, session: aiohttp.ClientSession) -> List[Dict]:
         """Scrape deals from Pick 'n Save"""
         deals = []
         sample_deals = [
@@ -143,10 +222,11 @@ class MilwaukeeDealFinder:
             deal['location_id'] = 'pns_glendale'
             deal['fuel_points'] = 2  # 2x fuel points on this item
         
-        logger.info(f"Found {len(sample_deals)} deals at Pick 'n Save")
+        logger.info("Found %d deals at Pick 'n Save", len(sample_deals))
         return sample_deals
     
-    async def scrape_cermak(self) -> List[Dict]:
+    @register_scraper('cermak')
+    async def scrape_cermak(self, session: aiohttp.ClientSession) -> List[Dict]:
         """Scrape deals from Cermak Fresh Market"""
         deals = []
         sample_deals = [
@@ -159,131 +239,201 @@ class MilwaukeeDealFinder:
             deal['store'] = 'Cermak Fresh Market'
             deal['location_id'] = 'cermak_milwaukee'
         
-        logger.info(f"Found {len(sample_deals)} deals at Cermak")
+        logger.info("Found %d deals at Cermak", len(sample_deals))
         return sample_deals
     
     async def scrape_all_stores(self):
         """Scrape deals from all enabled stores concurrently"""
-        tasks = []
+        # One pooled session for every scraper so keep-alive connections
+        # are reused instead of paying a TCP+TLS handshake per request
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=20)
+        )
         
-        if self.stores_config['stores']['metro_market']['enabled']:
-            tasks.append(self.scrape_metro_market())
-        if self.stores_config['stores']['sendiks']['enabled']:
-            tasks.append(self.scrape_sendiks())
-        if self.stores_config['stores']['walmart']['enabled']:
-            tasks.append(self.scrape_walmart())
-        if self.stores_config['stores']['pick_n_save']['enabled']:
-            tasks.append(self.scrape_pick_n_save())
-        if self.stores_config['stores']['cermak']['enabled']:
-            tasks.append(self.scrape_cermak())
+        # Bound how many scrapers hit the network at once
+        sem = asyncio.Semaphore(self.stores_config['settings'].get('max_concurrent', 5))
         
-        all_deals = await asyncio.gather(*tasks)
+        async def guarded(coro):
+            async with sem:
+                return await coro
+        
+        try:
+            stores = self.stores_config['stores']
+            tasks = {
+                store_key: scraper(self, self._session)
+                for store_key, scraper in _SCRAPERS.items()
+                if stores.get(store_key, {}).get('enabled')
+            }
+            
+            results = await asyncio.gather(*(guarded(t) for t in tasks.values()),
+                                           return_exceptions=True)
+        finally:
+            await self._session.close()
+            self._session = None
+        
+        # A failing store shouldn't cost us the deals from the others
+        all_deals = []
+        for store_key, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                logger.error("Scraping %s failed: %s", store_key, result)
+            else:
+                all_deals.append(result)
         
         # Flatten the list of lists
         self.deals = [deal for store_deals in all_deals for deal in store_deals]
-        logger.info(f"Total deals found: {len(self.deals)}")
+        logger.info("Total deals found: %d", len(self.deals))
     
-    def match_deals_to_list(self) -> Dict[str, List[Dict]]:
-        """Match found deals to shopping list items"""
-        matched_deals = {}
+    def _match_pairs(self) -> np.ndarray:
+        """Return (item index, deal index) pairs that match and fit the budget
         
-        for item in self.shopping_list:
-            item_name = item['item'].lower()
-            matched_deals[item['item']] = []
-            
-            for deal in self.deals:
-                # Simple fuzzy matching - in production, use fuzzywuzzy or AI
-                if item_name in deal['item'].lower():
-                    # Check if price is within budget
-                    if deal['price'] <= item['max_price']:
-                        matched_deals[item['item']].append(deal)
-            
-            # Sort by price for each item
-            matched_deals[item['item']].sort(key=lambda x: x['price'])
+        Pairs are ordered by item, then by deal price.
+        """
+        if not self.shopping_list or not self.deals:
+            return np.empty((0, 2), dtype=np.intp)
+        
+        # Lay out the fields the matcher reads as parallel arrays, rebuilt on
+        # every call so edits to the deals or the list are always seen
+        item_names = [item['item'].lower() for item in self.shopping_list]
+        max_prices = np.array([item['max_price'] for item in self.shopping_list], dtype=np.float64)
+        deal_names = [deal['item'].lower() for deal in self.deals]
+        deal_prices = np.array([deal['price'] for deal in self.deals], dtype=np.float64)
+        
+        # Score every (shopping item, deal) pair in one vectorized call
+        scores = process.cdist(item_names, deal_names, scorer=fuzz.token_set_ratio,
+                               score_cutoff=MATCH_SCORE_CUTOFF, workers=-1)
+        
+        # token_set_ratio is symmetric and forgiving: "Pasta Sauce" scores 100
+        # against a plain "Pasta" deal and "Chicken Breast" 81.5 against
+        # "Chicken Broth". Also require every item word to match a deal word
+        item_words = [name.split() for name in item_names]
+        covered = self._words_covered(item_words, [name.split() for name in deal_names])
         
-        return matched_deals
+        # A deal named after a more specific list item goes to that item only,
+        # so "Pasta Sauce" deals aren't offered for "Pasta" as well
+        word_counts = np.array([len(words) for words in item_words])
+        specificity = np.where(covered, word_counts[:, None], -1)
+        
+        matches = ((scores >= MATCH_SCORE_CUTOFF)
+                   & covered
+                   & (specificity == specificity.max(axis=0))
+                   & (deal_prices[None, :] <= max_prices[:, None]))
+        
+        pairs = np.argwhere(matches)
+        # Stable sort keeps scrape order among equally priced deals
+        order = np.lexsort((deal_prices[pairs[:, 1]], pairs[:, 0]))
+        return pairs[order]
     
-    def optimize_shopping_route(self, matched_deals: Dict) -> Dict:
-        """Determine optimal stores to visit based on deals and location"""
+    @staticmethod
+    def _words_covered(item_words: List[List[str]], deal_words: List[List[str]]) -> np.ndarray:
+        """Return an (item, deal) mask of pairs where every item word fuzzy-matches a deal word"""
+        item_vocab = {word: i for i, word in enumerate(dict.fromkeys(w for words in item_words for w in words))}
+        deal_vocab = {word: i for i, word in enumerate(dict.fromkeys(w for words in deal_words for w in words))}
+        
+        # Score each distinct word pair once, then spread the hits over the
+        # items and deals with incidence matrices
+        word_hits = process.cdist(list(item_vocab), list(deal_vocab), scorer=fuzz.ratio,
+                                  score_cutoff=MATCH_SCORE_CUTOFF, workers=-1) > 0
+        
+        deal_incidence = np.zeros((len(deal_vocab), len(deal_words)), dtype=np.intp)
+        for d, words in enumerate(deal_words):
+            deal_incidence[[deal_vocab[w] for w in words], d] = 1
+        item_incidence = np.zeros((len(item_words), len(item_vocab)), dtype=np.intp)
+        for i, words in enumerate(item_words):
+            item_incidence[i, [item_vocab[w] for w in words]] = 1
+        
+        # word_in_deal[w, d] is whether item word w matches any word of deal d
+        word_in_deal = (word_hits.astype(np.intp) @ deal_incidence) > 0
+        matched = item_incidence @ word_in_deal.astype(np.intp)
+        return matched == item_incidence.sum(axis=1)[:, None]
+    
+    def match_deals_to_list(self) -> Dict[str, List[Dict]]:
+        """Match found deals to shopping list items"""
+        return self.build_plan()[0]
+    
+    def build_plan(self) -> Tuple[Dict[str, List[Dict]], Dict]:
+        """Match deals to the shopping list and total per-store savings
+        
+        Returns (matched_deals, route_optimization), with each item's
+        deals sorted by price and the top stores by savings recommended.
+        """
+        matched_deals = {item['item']: [] for item in self.shopping_list}
         store_savings = {}
         
-        # Calculate total savings per store
-        for item, deals in matched_deals.items():
-            for deal in deals:
-                store = deal['store']
-                if store not in store_savings:
-                    store_savings[store] = {
-                        'items': [],
-                        'total_savings': 0,
-                        'item_count': 0
-                    }
-                
-                # Find the item's max price from shopping list
-                max_price = next(i['max_price'] for i in self.shopping_list if i['item'] == item)
-                savings = max_price - deal['price']
-                
-                store_savings[store]['items'].append({
-                    'item': item,
-                    'price': deal['price'],
-                    'savings': savings
-                })
-                store_savings[store]['total_savings'] += savings
-                store_savings[store]['item_count'] += 1
-        
-        # Sort stores by total savings
-        sorted_stores = sorted(store_savings.items(), 
-                             key=lambda x: x[1]['total_savings'], 
-                             reverse=True)
-        
-        # Limit to max stores per trip
+        # Pairs come back within budget and sorted by price for each item
+        for item_idx, deal_idx in self._match_pairs():
+            item = self.shopping_list[item_idx]
+            deal = self.deals[deal_idx]
+            matched_deals[item['item']].append(deal)
+            
+            savings = item['max_price'] - deal['price']
+            store = store_savings.setdefault(deal['store'], {
+                'items': [],
+                'total_savings': 0,
+                'item_count': 0
+            })
+            store['items'].append({
+                'item': item['item'],
+                'price': deal['price'],
+                'savings': savings
+            })
+            store['total_savings'] += savings
+            store['item_count'] += 1
+        
+        # Limit to max stores per trip, picking those with the most savings
         max_stores = self.stores_config['settings']['max_stores_per_trip']
-        recommended_stores = sorted_stores[:max_stores]
+        recommended_stores = heapq.nlargest(max_stores, store_savings.items(),
+                                            key=lambda x: x[1]['total_savings'])
         
-        return {
+        return matched_deals, {
             'recommended_stores': recommended_stores,
             'all_store_savings': store_savings
         }
     
     def generate_report(self, matched_deals: Dict, route_optimization: Dict):
         """Generate shopping report"""
-        report_path = self.base_dir / "output" / f"shopping_report_{datetime.now().strftime('%Y%m%d')}.md"
+        now = datetime.now()
+        report_path = self.OUTPUT_DIR / f"shopping_report_{now.strftime('%Y%m%d')}.md"
         report_path.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(report_path, 'w') as f:
-            f.write("# 🛒 Milwaukee Shopping Report\n\n")
-            f.write(f"**Generated**: {datetime.now().strftime('%Y-%m-%d %I:%M %p')}\n\n")
-            
-            # Best deals summary
-            f.write("## 💰 Best Deals Found\n\n")
-            for item, deals in matched_deals.items():
-                if deals:
-                    best_deal = deals[0]  # Already sorted by price
-                    f.write(f"### {item}\n")
-                    f.write(f"- **Best Price**: ${best_deal['price']:.2f} at {best_deal['store']}\n")
-                    if len(deals) > 1:
-                        f.write(f"- **Also available at**:\n")
-                        for deal in deals[1:3]:  # Show up to 3 alternatives
-                            f.write(f"  - ${deal['price']:.2f} at {deal['store']}\n")
-                    f.write("\n")
-            
-            # Recommended shopping route
-            f.write("## 🗺️ Recommended Shopping Route\n\n")
-            total_savings = 0
-            for store, data in route_optimization['recommended_stores']:
-                f.write(f"### {store}\n")
-                f.write(f"- **Items to buy**: {data['item_count']}\n")
-                f.write(f"- **Total savings**: ${data['total_savings']:.2f}\n")
-                f.write("- **Shopping list**:\n")
-                for item in data['items']:
-                    f.write(f"  - {item['item']}: ${item['price']:.2f} (save ${item['savings']:.2f})\n")
-                f.write("\n")
-                total_savings += data['total_savings']
-            
-            f.write(f"## 📊 Summary\n\n")
-            f.write(f"- **Total potential savings**: ${total_savings:.2f}\n")
-            f.write(f"- **Number of stores to visit**: {len(route_optimization['recommended_stores'])}\n")
-            
-        logger.info(f"Report generated: {report_path}")
+        parts = []
+        w = parts.append
+        w("# 🛒 Milwaukee Shopping Report\n\n")
+        w(f"**Generated**: {now.strftime('%Y-%m-%d %I:%M %p')}\n\n")
+        
+        # Best deals summary
+        w("## 💰 Best Deals Found\n\n")
+        for item, deals in matched_deals.items():
+            if deals:
+                best_deal = deals[0]  # Already sorted by price
+                w(f"### {item}\n")
+                w(f"- **Best Price**: ${best_deal['price']:.2f} at {best_deal['store']}\n")
+                if len(deals) > 1:
+                    w("- **Also available at**:\n")
+                    for deal in deals[1:3]:  # Show up to 3 alternatives
+                        w(f"  - ${deal['price']:.2f} at {deal['store']}\n")
+                w("\n")
+        
+        # Recommended shopping route
+        w("## 🗺️ Recommended Shopping Route\n\n")
+        total_savings = 0
+        for store, data in route_optimization['recommended_stores']:
+            w(f"### {store}\n")
+            w(f"- **Items to buy**: {data['item_count']}\n")
+            w(f"- **Total savings**: ${data['total_savings']:.2f}\n")
+            w("- **Shopping list**:\n")
+            for item in data['items']:
+                w(f"  - {item['item']}: ${item['price']:.2f} (save ${item['savings']:.2f})\n")
+            w("\n")
+            total_savings += data['total_savings']
+        
+        w("## 📊 Summary\n\n")
+        w(f"- **Total potential savings**: ${total_savings:.2f}\n")
+        w(f"- **Number of stores to visit**: {len(route_optimization['recommended_stores'])}\n")
+        
+        report_path.write_text("".join(parts))
+        
+        logger.info("Report generated: %s", report_path)
         return report_path
 
 async def main():
@@ -292,14 +442,16 @@ async def main():
     
     finder = MilwaukeeDealFinder()
     
+    # Nothing to match against, so skip the scrape entirely
+    if not finder.shopping_list:
+        logger.warning("Empty shopping list; nothing to do")
+        return
+    
     # Scrape all stores
     await finder.scrape_all_stores()
     
-    # Match deals to shopping list
-    matched_deals = finder.match_deals_to_list()
-    
-    # Optimize shopping route
-    route_optimization = finder.optimize_shopping_route(matched_deals)
+    # Match deals to shopping list and pick the stores with the best savings
+    matched_deals, route_optimization = finder.build_plan()
     
     # Generate report
     report_path = finder.generate_report(matched_deals, route_optimization)
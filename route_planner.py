@@ -4,11 +4,32 @@ Route planner for optimal shopping trips in Milwaukee
 Calculates the most efficient route between stores
 """
 
-import json
+import orjson
 import math
+import numpy as np
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 from typing import List, Dict, Tuple
 from datetime import datetime, timedelta
 import os
+from pathlib import Path
+
+# Trips with at most this many stops are solved exactly; larger ones fall
+# back to nearest-neighbor (Held-Karp is O(N^2 * 2^N))
+HELD_KARP_MAX_STOPS = 15
+
+@dataclass(slots=True)
+class Stop:
+    """One leg of a planned route, ending at a store"""
+    store: str
+    distance: float
+    drive_time: int
+    pickup_time: int
+    address: str
+    
+    def asdict(self) -> Dict:
+        """Plain dict form for JSON callers"""
+        return asdict(self)
 
 class RouteOptimizer:
     def __init__(self):
@@ -16,10 +37,22 @@ class RouteOptimizer:
         self.home_location = (43.0389, -87.9065)  # Milwaukee downtown default
         self.stores = self.load_store_locations()
         
+        # Pairwise distances between home (index 0) and every store, computed
+        # once so routing is pure table lookups
+        self._idx = {name: i + 1 for i, name in enumerate(self.stores)}
+        self._coords_rad = np.radians(np.array(
+            [self.home_location] + [info['coords'] for info in self.stores.values()]
+        ))
+        self._dist_matrix = self._haversine_cdist(self._coords_rad, self._coords_rad)
+        
+        # (pickup_time, address) per store, read once per route leg
+        self._store_tuple = {name: (info['pickup_time'], info['address'])
+                             for name, info in self.stores.items()}
+        
     def load_store_locations(self) -> Dict:
         """Load store locations with coordinates"""
         # Real coordinates for Milwaukee stores
-        return {
+        stores = {
             'Metro Market': {
                 'address': '4075 N Oakland Ave, Shorewood, WI',
                 'coords': (43.1122, -87.8856),
@@ -51,6 +84,13 @@ class RouteOptimizer:
                 'pickup_time': 25
             }
         }
+        
+        # Parse opening hours once into (hour, minute) tuples
+        for info in stores.values():
+            info['open_hm'] = tuple(map(int, info['hours']['open'].split(':')))
+            info['close_hm'] = tuple(map(int, info['hours']['close'].split(':')))
+        
+        return stores
     
     def calculate_distance(self, coord1: Tuple, coord2: Tuple) -> float:
         """Calculate distance between two coordinates in miles"""
@@ -68,7 +108,95 @@ class RouteOptimizer:
         
         return R * c
     
-    def estimate_drive_time(self, distance: float) -> int:
+    @staticmethod
+    def _haversine_batch(cur_rad: np.ndarray, coords_rad: np.ndarray) -> np.ndarray:
+        """Distances in miles from one (lat, lon) radian point to each row of coords_rad"""
+        dlat = coords_rad[:, 0] - cur_rad[0]
+        dlon = coords_rad[:, 1] - cur_rad[1]
+        a = np.sin(dlat / 2)**2 + np.cos(cur_rad[0]) * np.cos(coords_rad[:, 0]) * np.sin(dlon / 2)**2
+        return 3959 * 2 * np.arcsin(np.sqrt(a))
+    
+    @staticmethod
+    def _haversine_cdist(a_rad: np.ndarray, b_rad: np.ndarray) -> np.ndarray:
+        """Matrix of distances in miles between rows of a_rad and rows of b_rad"""
+        dlat = b_rad[None, :, 0] - a_rad[:, None, 0]
+        dlon = b_rad[None, :, 1] - a_rad[:, None, 1]
+        a = (np.sin(dlat / 2)**2
+             + np.cos(a_rad[:, None, 0]) * np.cos(b_rad[None, :, 0]) * np.sin(dlon / 2)**2)
+        return 3959 * 2 * np.arcsin(np.sqrt(a))
+    
+    def _route_matrix(self, selected_stores: List[str], start_location: Tuple) -> np.ndarray:
+        """Distances between the start (index 0) and selected stores (1..N)"""
+        idx = [0] + [self._idx[store] for store in selected_stores]
+        dist = self._dist_matrix[np.ix_(idx, idx)]
+        
+        if start_location != self.home_location:
+            start_row = self._haversine_batch(np.radians(start_location), self._coords_rad[idx])
+            start_row[0] = 0
+            dist[0, :] = start_row
+            dist[:, 0] = start_row
+        
+        return dist
+    
+    @staticmethod
+    def _nearest_neighbor_order(dist: np.ndarray) -> List[int]:
+        """Visit order of stops 1..N, always driving to the nearest unvisited one"""
+        # Visited stops get their column set to inf so argmin skips them
+        # without building a masked copy of the row each step
+        remaining = dist.copy()
+        remaining[:, 0] = np.inf
+        current = 0
+        order = []
+        
+        for _ in range(len(dist) - 1):
+            nearest = int(np.argmin(remaining[current]))
+            order.append(nearest)
+            remaining[:, nearest] = np.inf
+            current = nearest
+        
+        return order
+    
+    @staticmethod
+    def _held_karp_order(dist: np.ndarray) -> List[int]:
+        """Shortest round-trip visit order of stops 1..N via bitmask DP"""
+        n = len(dist) - 1
+        if n <= 1:
+            return list(range(1, n + 1))
+        
+        legs = dist[1:, 1:]
+        bits = 1 << np.arange(n)
+        masks = np.arange(1 << n)
+        popcount = sum((masks >> i) & 1 for i in range(n))
+        
+        # dp[mask, j]: shortest path from the start through the stops in mask, ending at j
+        dp = np.full((1 << n, n), np.inf)
+        parent = np.full((1 << n, n), -1, dtype=np.intp)
+        dp[bits, np.arange(n)] = dist[0, 1:]
+        
+        # Every subset of a given size depends only on the previous size
+        for size in range(2, n + 1):
+            layer = masks[popcount == size]
+            prev = layer[:, None] ^ bits[None, :]
+            cand = dp[prev] + legs.T[None, :, :]
+            best_k = np.argmin(cand, axis=2)
+            best = np.take_along_axis(cand, best_k[..., None], axis=2)[..., 0]
+            in_mask = (layer[:, None] & bits[None, :]) != 0
+            dp[layer] = np.where(in_mask, best, np.inf)
+            parent[layer] = best_k
+        
+        # Close the loop back to the start, then walk parents backwards
+        mask = (1 << n) - 1
+        j = int(np.argmin(dp[mask] + dist[1:, 0]))
+        order = []
+        while j != -1:
+            order.append(j + 1)
+            mask, j = mask ^ (1 << j), int(parent[mask, j])
+        
+        return order[::-1]
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def estimate_drive_time(distance: float) -> int:
         """Estimate drive time in minutes based on distance"""
         # Assume average speed of 25 mph in Milwaukee area
         avg_speed = 25
@@ -78,47 +206,46 @@ class RouteOptimizer:
     
     def find_optimal_route(self, selected_stores: List[str], 
                           start_location: Tuple = None) -> Dict:
-        """Find the optimal route using nearest neighbor algorithm"""
+        """Find the shortest round trip through the selected stores"""
         if not start_location:
             start_location = self.home_location
         
+        dist = self._route_matrix(selected_stores, start_location)
+        
         route = []
-        unvisited = selected_stores.copy()
-        current_location = start_location
+        current = 0
         total_distance = 0
         total_time = 0
         
-        while unvisited:
-            # Find nearest unvisited store
-            nearest_store = None
-            min_distance = float('inf')
-            
-            for store in unvisited:
-                store_coords = self.stores[store]['coords']
-                distance = self.calculate_distance(current_location, store_coords)
-                
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_store = store
+        if len(selected_stores) <= HELD_KARP_MAX_STOPS:
+            order = self._held_karp_order(dist)
+        else:
+            order = self._nearest_neighbor_order(dist)
+        
+        store_tuple = self._store_tuple
+        estimate_drive_time = self.estimate_drive_time
+        
+        for stop in order:
+            store = selected_stores[stop - 1]
+            distance = float(dist[current, stop])
+            pickup_time, address = store_tuple[store]
             
             # Add to route
-            route.append({
-                'store': nearest_store,
-                'distance': min_distance,
-                'drive_time': self.estimate_drive_time(min_distance),
-                'pickup_time': self.stores[nearest_store]['pickup_time'],
-                'address': self.stores[nearest_store]['address']
-            })
-            
-            total_distance += min_distance
-            total_time += self.estimate_drive_time(min_distance) + self.stores[nearest_store]['pickup_time']
+            leg = Stop(
+                store=store,
+                distance=distance,
+                drive_time=estimate_drive_time(distance),
+                pickup_time=pickup_time,
+                address=address
+            )
+            route.append(leg)
             
-            # Update current location
-            current_location = self.stores[nearest_store]['coords']
-            unvisited.remove(nearest_store)
+            total_distance += distance
+            total_time += leg.drive_time + leg.pickup_time
+            current = stop
         
         # Add return home
-        home_distance = self.calculate_distance(current_location, start_location)
+        home_distance = float(dist[current, 0])
         total_distance += home_distance
         total_time += self.estimate_drive_time(home_distance)
         
@@ -130,45 +257,45 @@ class RouteOptimizer:
         }
     
     def optimize_for_time_windows(self, selected_stores: List[str], 
-                                 preferred_time: str = "10:00") -> Dict:
-        """Optimize route considering store hours and pickup windows"""
-        route_info = self.find_optimal_route(selected_stores)
+                                 preferred_time: str = "10:00",
+                                 route_info: Dict = None) -> Dict:
+        """Optimize route considering store hours and pickup windows
+        
+        Pass route_info from find_optimal_route() to reuse an already
+        computed route instead of solving it again.
+        """
+        if route_info is None:
+            route_info = self.find_optimal_route(selected_stores)
         
         # Parse preferred start time
         hour, minute = map(int, preferred_time.split(':'))
-        current_time = datetime.now().replace(hour=hour, minute=minute, second=0)
+        today = datetime.now().replace(second=0, microsecond=0)
+        current_time = today.replace(hour=hour, minute=minute)
         
         schedule = []
         
         for stop in route_info['route']:
-            store = stop['store']
-            arrival_time = current_time + timedelta(minutes=stop['drive_time'])
+            store = stop.store
+            arrival_time = current_time + timedelta(minutes=stop.drive_time)
             
             # Check if store is open
-            store_hours = self.stores[store]['hours']
-            open_time = datetime.now().replace(
-                hour=int(store_hours['open'].split(':')[0]),
-                minute=int(store_hours['open'].split(':')[1]),
-                second=0
-            )
-            close_time = datetime.now().replace(
-                hour=int(store_hours['close'].split(':')[0]),
-                minute=int(store_hours['close'].split(':')[1]),
-                second=0
-            )
+            info = self.stores[store]
+            (open_h, open_m), (close_h, close_m) = info['open_hm'], info['close_hm']
+            open_time = today.replace(hour=open_h, minute=open_m)
+            close_time = today.replace(hour=close_h, minute=close_m)
             
             # Adjust if arriving before opening
             if arrival_time < open_time:
                 arrival_time = open_time
             
-            departure_time = arrival_time + timedelta(minutes=stop['pickup_time'])
+            departure_time = arrival_time + timedelta(minutes=stop.pickup_time)
             
             schedule.append({
                 'store': store,
                 'arrival': arrival_time.strftime('%I:%M %p'),
                 'departure': departure_time.strftime('%I:%M %p'),
-                'address': stop['address'],
-                'pickup_time': stop['pickup_time'],
+                'address': stop.address,
+                'pickup_time': stop.pickup_time,
                 'status': 'OK' if arrival_time < close_time else 'CLOSED'
             })
             
@@ -182,8 +309,10 @@ class RouteOptimizer:
             'finish_time': current_time.strftime('%I:%M %p')
         }
     
-    def calculate_gas_cost(self, total_distance: float, 
-                          gas_price: float = 3.29) -> float:
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def calculate_gas_cost(total_distance: float, 
+                           gas_price: float = 3.29) -> float:
         """Calculate estimated gas cost for the trip"""
         avg_mpg = 25  # Average fuel efficiency
         gallons_needed = total_distance / avg_mpg
@@ -193,48 +322,50 @@ class RouteOptimizer:
                              savings_data: Dict = None) -> str:
         """Generate a detailed route report"""
         route_info = self.find_optimal_route(stores)
-        schedule = self.optimize_for_time_windows(stores)
+        schedule = self.optimize_for_time_windows(stores, route_info=route_info)
         gas_cost = self.calculate_gas_cost(route_info['total_distance'])
         
-        report = "# 🗺️ Optimized Shopping Route\n\n"
-        report += f"**Date**: {datetime.now().strftime('%Y-%m-%d')}\n"
-        report += f"**Stores to visit**: {', '.join(stores)}\n\n"
+        parts = []
+        w = parts.append
+        w("# 🗺️ Optimized Shopping Route\n\n")
+        w(f"**Date**: {datetime.now().strftime('%Y-%m-%d')}\n")
+        w(f"**Stores to visit**: {', '.join(stores)}\n\n")
         
-        report += "## 📍 Route Details\n\n"
+        w("## 📍 Route Details\n\n")
         for i, stop in enumerate(schedule['schedule'], 1):
-            report += f"### Stop {i}: {stop['store']}\n"
-            report += f"- **Address**: {stop['address']}\n"
-            report += f"- **Arrival**: {stop['arrival']}\n"
-            report += f"- **Pickup Time**: {stop['pickup_time']} minutes\n"
-            report += f"- **Departure**: {stop['departure']}\n"
+            w(f"### Stop {i}: {stop['store']}\n")
+            w(f"- **Address**: {stop['address']}\n")
+            w(f"- **Arrival**: {stop['arrival']}\n")
+            w(f"- **Pickup Time**: {stop['pickup_time']} minutes\n")
+            w(f"- **Departure**: {stop['departure']}\n")
             if stop['status'] == 'CLOSED':
-                report += f"- ⚠️ **WARNING**: Store may be closed\n"
-            report += "\n"
+                w("- ⚠️ **WARNING**: Store may be closed\n")
+            w("\n")
         
-        report += "## 📊 Trip Summary\n\n"
-        report += f"- **Total Distance**: {route_info['total_distance']} miles\n"
-        report += f"- **Total Time**: {route_info['total_time']} minutes\n"
-        report += f"- **Estimated Gas Cost**: ${gas_cost}\n"
-        report += f"- **Return Home**: {route_info['return_home_distance']} miles\n"
-        report += f"- **Expected Finish Time**: {schedule['finish_time']}\n\n"
+        w("## 📊 Trip Summary\n\n")
+        w(f"- **Total Distance**: {route_info['total_distance']} miles\n")
+        w(f"- **Total Time**: {route_info['total_time']} minutes\n")
+        w(f"- **Estimated Gas Cost**: ${gas_cost}\n")
+        w(f"- **Return Home**: {route_info['return_home_distance']} miles\n")
+        w(f"- **Expected Finish Time**: {schedule['finish_time']}\n\n")
         
         if savings_data:
             total_savings = sum(savings_data.values())
             net_savings = total_savings - gas_cost
-            report += f"## 💰 Financial Summary\n\n"
-            report += f"- **Total Savings**: ${total_savings:.2f}\n"
-            report += f"- **Gas Cost**: -${gas_cost}\n"
-            report += f"- **Net Savings**: ${net_savings:.2f}\n\n"
+            w("## 💰 Financial Summary\n\n")
+            w(f"- **Total Savings**: ${total_savings:.2f}\n")
+            w(f"- **Gas Cost**: -${gas_cost}\n")
+            w(f"- **Net Savings**: ${net_savings:.2f}\n\n")
         
-        report += "## 🚗 Driving Directions\n\n"
-        report += "1. Start from home\n"
+        w("## 🚗 Driving Directions\n\n")
+        w("1. Start from home\n")
         for i, stop in enumerate(schedule['schedule'], 1):
-            report += f"{i+1}. Drive to {stop['store']} ({stop['address']})\n"
-        report += f"{len(schedule['schedule'])+2}. Return home\n\n"
+            w(f"{i+1}. Drive to {stop['store']} ({stop['address']})\n")
+        w(f"{len(schedule['schedule'])+2}. Return home\n\n")
         
-        report += "*Note: Times are estimates. Check Google Maps for real-time traffic.*\n"
+        w("*Note: Times are estimates. Check Google Maps for real-time traffic.*\n")
         
-        return report
+        return "".join(parts)
 
 def main():
     """Test the route optimizer"""
@@ -249,7 +380,7 @@ def main():
     
     # Generate schedule
     schedule = optimizer.optimize_for_time_windows(selected_stores, "09:00")
-    print("\nShopping Schedule:", json.dumps(schedule, indent=2))
+    print("\nShopping Schedule:", orjson.dumps(schedule, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode())
     
     # Generate full report
     report = optimizer.generate_route_report(
@@ -258,8 +389,7 @@ def main():
     )
     
     # Save report
-    with open("route_report.md", "w") as f:
-        f.write(report)
+    Path("route_report.md").write_text(report)
     
     print("\nRoute report saved to route_report.md")
 
@@ -5,11 +5,200 @@ Sends beautiful HTML emails with found deals
 """
 
 import os
+import gzip
 import json
+import asyncio
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from jinja2 import Environment
+
+# Line prefixes in the markdown written by find_deals.generate_report()
+_SAVINGS_PREFIX = '- **Total potential savings**: $'
+_BEST_PRICE_PREFIX = '- **Best Price**: $'
+
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+
+# Used when a send isn't given a subject; main() passes a dated one
+DEFAULT_SUBJECT = "💰 Your Shopping Deals"
+
+# SendGrid's limit on personalizations in a single mail/send request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+# Concurrent mail/send requests and 429 retries per request for batch sends
+SENDGRID_MAX_CONCURRENT = 20
+SENDGRID_MAX_RETRIES = 3
+
+# mail/send bodies larger than this are sent gzip-encoded
+GZIP_MIN_BYTES = 1024
+
+TWILIO_MESSAGES_URL = "https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json"
+
+# Deal alert email, compiled once at import; autoescape keeps item and store
+# names like "M&M's" from breaking the markup
+_EMAIL_TEMPLATE = Environment(autoescape=True, trim_blocks=True, lstrip_blocks=True).from_string("""\
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Your Shopping Deals for {{ deals.date }}</title>
+    <style>
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 600px;
+            margin: 0 auto;
+            padding: 20px;
+            background-color: #f4f4f4;
+        }
+        .container {
+            background-color: white;
+            border-radius: 10px;
+            padding: 30px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+        .header {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            padding: 30px;
+            border-radius: 10px 10px 0 0;
+            text-align: center;
+            margin: -30px -30px 30px -30px;
+        }
+        .savings-badge {
+            display: inline-block;
+            background-color: #10b981;
+            color: white;
+            padding: 10px 20px;
+            border-radius: 25px;
+            font-size: 24px;
+            font-weight: bold;
+            margin: 20px 0;
+        }
+        .deal-card {
+            background-color: #f9fafb;
+            border-left: 4px solid #667eea;
+            padding: 15px;
+            margin: 15px 0;
+            border-radius: 5px;
+        }
+        .deal-item {
+            font-weight: bold;
+            color: #1f2937;
+            font-size: 16px;
+        }
+        .deal-price {
+            color: #059669;
+            font-size: 20px;
+            font-weight: bold;
+        }
+        .deal-store {
+            color: #6b7280;
+            font-size: 14px;
+        }
+        .action-button {
+            display: inline-block;
+            background-color: #667eea;
+            color: white;
+            padding: 12px 30px;
+            text-decoration: none;
+            border-radius: 5px;
+            font-weight: bold;
+            margin: 20px 0;
+        }
+        .footer {
+            text-align: center;
+            color: #6b7280;
+            font-size: 12px;
+            margin-top: 30px;
+            padding-top: 20px;
+            border-top: 1px solid #e5e7eb;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🛒 Your Shopping Deals Are Ready!</h1>
+            <div class="savings-badge">
+                Save ${{ '%.2f'|format(deals.total_savings) }} Today!
+            </div>
+        </div>
+
+        <h2>🔥 Top Deals Found</h2>
+        <p>We've analyzed prices at all your local stores. Here are today's best deals:</p>
+        {% for deal in deals.best_deals[:5] %}
+        <div class="deal-card">
+            <div class="deal-item">{{ deal.item }}</div>
+            <div class="deal-price">${{ deal.price }}</div>
+            <div class="deal-store">Available at {{ deal.store }}</div>
+        </div>
+        {% endfor %}
+        <div style="text-align: center;">
+            <a href="https://github.com/{{ repo }}/actions" class="action-button">
+                View Full Report
+            </a>
+        </div>
+
+        <h3>📍 Recommended Shopping Route</h3>
+        <p>Visit these stores in order for maximum efficiency:</p>
+        <ol>
+        {% for store in deals.get('recommended_stores', [])[:3] %}
+            <li>{{ store }}</li>
+        {% endfor %}
+        </ol>
+
+        <div class="footer">
+            <p>You're receiving this because you have deal alerts enabled.</p>
+            <p>Smart Shopping System • Save Money, Save Time</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+def _sendgrid_body(data: Dict) -> Tuple[bytes, Dict[str, str]]:
+    """Encode a mail/send body, gzipping it when it is large enough to pay off"""
+    body = json.dumps(data).encode('utf-8')
+    if len(body) <= GZIP_MIN_BYTES:
+        return body, {}
+    return gzip.compress(body), {"Content-Encoding": "gzip"}
+
+@lru_cache(maxsize=8)
+def _parse_report(path: str, mtime_ns: int) -> Tuple[float, Tuple[Tuple[str, str, str], ...]]:
+    """Parse a deals report into (total_savings, (item, price, store) rows)
+    
+    mtime_ns only keys the cache. The result is immutable because every
+    caller shares it.
+    """
+    total_savings = 0
+    best_deals = []
+    
+    # Parse markdown report in one pass: a deal is an "### Item" heading
+    # immediately followed by its "Best Price" line
+    item = None
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('### '):
+                item = line[4:]
+                continue
+    
+            if item is not None and line.startswith(_BEST_PRICE_PREFIX):
+                price, _, store = line[len(_BEST_PRICE_PREFIX):].partition(' at ')
+                best_deals.append((item, price, store))
+            elif line.startswith(_SAVINGS_PREFIX):
+                total_savings = float(line[len(_SAVINGS_PREFIX):])
+            item = None
+    
+    return total_savings, tuple(best_deals)
 
 class EmailNotifier:
     def __init__(self):
@@ -17,217 +206,137 @@ class EmailNotifier:
         self.email_address = os.environ.get('EMAIL_ADDRESS')
         self.base_dir = Path(__file__).parent.parent
         
-    def load_deals_report(self) -> Dict:
-        """Load the latest deals report"""
-        output_dir = self.base_dir / "output"
-        reports = sorted(output_dir.glob("shopping_report_*.md"), reverse=True)
+        # Sent with each SendGrid request only; the session is shared with
+        # Twilio, so credentials never go in its default headers
+        self._sendgrid_headers = {
+            "Authorization": f"Bearer {self.sendgrid_key}",
+            "Content-Type": "application/json"
+        }
+        
+        # Shared so multi-request sends reuse one pooled TLS connection
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
         
-        if not reports:
+    def load_deals_report(self, path: Optional[Path] = None) -> Dict:
+        """Load a deals report, defaulting to the latest one in output/"""
+        if path is not None:
+            latest = path
+        else:
+            # Names embed YYYYMMDD, so the greatest name is the newest report
+            output_dir = self.base_dir / "output"
+            latest = max(output_dir.glob("shopping_report_*.md"), key=lambda p: p.name, default=None)
+        
+        if latest is None:
             return None
             
-        # Parse markdown report
-        with open(reports[0], 'r') as f:
-            content = f.read()
-            
-        # Extract key information
-        deals = {
+        # Keyed on mtime so a rewritten report is parsed again
+        total_savings, best_deals = _parse_report(str(latest), latest.stat().st_mtime_ns)
+        
+        # Fresh dicts each call, so callers can edit them and the date is today's
+        return {
             'date': datetime.now().strftime('%B %d, %Y'),
-            'total_savings': 0,
-            'best_deals': [],
+            'total_savings': total_savings,
+            'best_deals': [
+                {'item': item, 'price': price, 'store': store}
+                for item, price, store in best_deals
+            ],
             'recommended_stores': []
         }
-        
-        # Parse savings amount
-        import re
-        savings_match = re.search(r'Total potential savings: \$(\d+\.\d+)', content)
-        if savings_match:
-            deals['total_savings'] = float(savings_match[1])
-        
-        # Parse deals
-        deal_pattern = re.compile(r'### (.*?)\n.*?Best Price: \$([\d.]+) at (.*?)\n')
-        for match in deal_pattern.finditer(content):
-            deals['best_deals'].append({
-                'item': match.group(1),
-                'price': match.group(2),
-                'store': match.group(3)
-            })
-        
-        return deals
     
     def create_html_email(self, deals: Dict) -> str:
         """Create beautiful HTML email"""
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Your Shopping Deals for {deals['date']}</title>
-            <style>
-                body {{
-                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    max-width: 600px;
-                    margin: 0 auto;
-                    padding: 20px;
-                    background-color: #f4f4f4;
-                }}
-                .container {{
-                    background-color: white;
-                    border-radius: 10px;
-                    padding: 30px;
-                    box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 30px;
-                    border-radius: 10px 10px 0 0;
-                    text-align: center;
-                    margin: -30px -30px 30px -30px;
-                }}
-                .savings-badge {{
-                    display: inline-block;
-                    background-color: #10b981;
-                    color: white;
-                    padding: 10px 20px;
-                    border-radius: 25px;
-                    font-size: 24px;
-                    font-weight: bold;
-                    margin: 20px 0;
-                }}
-                .deal-card {{
-                    background-color: #f9fafb;
-                    border-left: 4px solid #667eea;
-                    padding: 15px;
-                    margin: 15px 0;
-                    border-radius: 5px;
-                }}
-                .deal-item {{
-                    font-weight: bold;
-                    color: #1f2937;
-                    font-size: 16px;
-                }}
-                .deal-price {{
-                    color: #059669;
-                    font-size: 20px;
-                    font-weight: bold;
-                }}
-                .deal-store {{
-                    color: #6b7280;
-                    font-size: 14px;
-                }}
-                .action-button {{
-                    display: inline-block;
-                    background-color: #667eea;
-                    color: white;
-                    padding: 12px 30px;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    font-weight: bold;
-                    margin: 20px 0;
-                }}
-                .footer {{
-                    text-align: center;
-                    color: #6b7280;
-                    font-size: 12px;
-                    margin-top: 30px;
-                    padding-top: 20px;
-                    border-top: 1px solid #e5e7eb;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🛒 Your Shopping Deals Are Ready!</h1>
-                    <div class="savings-badge">
-                        Save ${deals['total_savings']:.2f} Today!
-                    </div>
-                </div>
-                
-                <h2>🔥 Top Deals Found</h2>
-                <p>We've analyzed prices at all your local stores. Here are today's best deals:</p>
-                """
-        
-        # Add deals
-        for deal in deals['best_deals'][:5]:  # Top 5 deals
-            html += f"""
-                <div class="deal-card">
-                    <div class="deal-item">{deal['item']}</div>
-                    <div class="deal-price">${deal['price']}</div>
-                    <div class="deal-store">Available at {deal['store']}</div>
-                </div>
-            """
+        return _EMAIL_TEMPLATE.render(
+            deals=deals,
+            repo=os.environ.get('GITHUB_REPOSITORY', '')
+        )
+    
+    def _sendgrid_payloads(self, html_content: str, subject: Optional[str],
+                           recipients: List[str]) -> Iterator[Tuple[List[str], Dict]]:
+        """Yield (recipients, mail/send body) chunks of up to 1000 recipients"""
+        # One personalization per recipient, so each only sees their own address
+        recipient_iter = iter(recipients)
+        while chunk := list(islice(recipient_iter, SENDGRID_MAX_PERSONALIZATIONS)):
+            yield chunk, {
+                "personalizations": [{"to": [{"email": r}]} for r in chunk],
+                "from": {"email": "deals@smartshoppingsystem.com", "name": "Smart Shopping System"},
+                "subject": subject or DEFAULT_SUBJECT,
+                "content": [
+                    {"type": "text/html", "value": html_content}
+                ]
+            }
+    
+    def send_email(self, html_content: str, subject: str = None,
+                   recipients: List[str] = None):
+        """Send email via SendGrid"""
+        if recipients is None:
+            recipients = [self.email_address] if self.email_address else []
         
-        html += f"""
-                <div style="text-align: center;">
-                    <a href="https://github.com/{os.environ.get('GITHUB_REPOSITORY', '')}/actions" class="action-button">
-                        View Full Report
-                    </a>
-                </div>
-                
-                <h3>📍 Recommended Shopping Route</h3>
-                <p>Visit these stores in order for maximum efficiency:</p>
-                <ol>
-        """
+        if not self.sendgrid_key or not recipients:
+            print("Email configuration missing")
+            return False
         
-        for store in deals.get('recommended_stores', [])[:3]:
-            html += f"<li>{store}</li>"
+        sent = True
+        for chunk, data in self._sendgrid_payloads(html_content, subject, recipients):
+            try:
+                body, extra_headers = _sendgrid_body(data)
+                response = self._session.post(SENDGRID_URL, data=body, timeout=10,
+                                              headers={**self._sendgrid_headers, **extra_headers})
+                if response.status_code == 202:
+                    print(f"✅ Email sent successfully to {len(chunk)} recipients")
+                else:
+                    print(f"❌ Email failed: {response.status_code} - {response.text}")
+                    sent = False
+            except Exception as e:
+                print(f"❌ Email error: {e}")
+                sent = False
         
-        html += """
-                </ol>
-                
-                <div class="footer">
-                    <p>You're receiving this because you have deal alerts enabled.</p>
-                    <p>Smart Shopping System • Save Money, Save Time</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return html
+        return sent
     
-    def send_email(self, html_content: str, subject: str = None):
-        """Send email via SendGrid"""
-        if not self.sendgrid_key or not self.email_address:
+    async def send_batch_async(self, recipients: List[str], html_content: str,
+                               subject: str = None) -> bool:
+        """Send email to many recipients via concurrent SendGrid requests"""
+        if not self.sendgrid_key or not recipients:
             print("Email configuration missing")
             return False
         
-        if not subject:
-            subject = f"💰 Shopping Deals for {datetime.now().strftime('%B %d')}"
+        async def post(session: aiohttp.ClientSession, data: Dict) -> None:
+            body, extra_headers = _sendgrid_body(data)
+            # Back off on 429 instead of failing the whole chunk
+            for attempt in range(SENDGRID_MAX_RETRIES + 1):
+                async with session.post(SENDGRID_URL, data=body, headers=extra_headers) as response:
+                    if response.status == 202:
+                        return
+                    if response.status != 429 or attempt == SENDGRID_MAX_RETRIES:
+                        raise RuntimeError(f"{response.status} - {await response.text()}")
+                    retry_after = response.headers.get('Retry-After', '')
+                    delay = int(retry_after) if retry_after.isdigit() else 2 ** attempt
+                await asyncio.sleep(delay)
         
-        # SendGrid API
-        url = "https://api.sendgrid.com/v3/mail/send"
-        headers = {
-            "Authorization": f"Bearer {self.sendgrid_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "personalizations": [{
-                "to": [{"email": self.email_address}]
-            }],
-            "from": {"email": "deals@smartshoppingsystem.com", "name": "Smart Shopping System"},
-            "subject": subject,
-            "content": [
-                {"type": "text/html", "value": html_content}
-            ]
-        }
+        payloads = list(self._sendgrid_payloads(html_content, subject, recipients))
+        async with aiohttp.ClientSession(
+            headers=self._sendgrid_headers,
+            timeout=aiohttp.ClientTimeout(total=10),
+            connector=aiohttp.TCPConnector(limit=SENDGRID_MAX_CONCURRENT)
+        ) as session:
+            results = await asyncio.gather(
+                *(post(session, data) for _, data in payloads),
+                return_exceptions=True
+            )
         
-        try:
-            response = requests.post(url, headers=headers, json=data)
-            if response.status_code == 202:
-                print(f"✅ Email sent successfully to {self.email_address}")
-                return True
+        sent = True
+        for (chunk, _), result in zip(payloads, results):
+            if isinstance(result, Exception):
+                print(f"❌ Email failed for {len(chunk)} recipients: {result}")
+                sent = False
             else:
-                print(f"❌ Email failed: {response.status_code} - {response.text}")
-                return False
-        except Exception as e:
-            print(f"❌ Email error: {e}")
-            return False
+                print(f"✅ Email sent successfully to {len(chunk)} recipients")
+        
+        return sent
+    
+    def send_batch(self, recipients: List[str], html_content: str,
+                   subject: str = None) -> bool:
+        """Synchronous wrapper around send_batch_async()"""
+        return asyncio.run(self.send_batch_async(recipients, html_content, subject))
     
     def send_text_notification(self, message: str, phone: str = None):
         """Send SMS notification via Twilio (optional)"""
@@ -238,17 +347,17 @@ class EmailNotifier:
         if not all([twilio_sid, twilio_token, twilio_from, phone]):
             return False
         
+        # Plain REST call on the shared session instead of the Twilio SDK
         try:
-            from twilio.rest import Client
-            client = Client(twilio_sid, twilio_token)
-            
-            message = client.messages.create(
-                body=message,
-                from_=twilio_from,
-                to=phone
+            response = self._session.post(
+                TWILIO_MESSAGES_URL.format(sid=twilio_sid),
+                auth=(twilio_sid, twilio_token),
+                data={"From": twilio_from, "To": phone, "Body": message},
+                timeout=10
             )
+            response.raise_for_status()
             
-            print(f"✅ SMS sent: {message.sid}")
+            print(f"✅ SMS sent: {response.json()['sid']}")
             return True
         except Exception as e:
             print(f"SMS error: {e}")
@@ -258,8 +367,9 @@ def main():
     """Main execution"""
     notifier = EmailNotifier()
     
-    # Load deals
-    deals = notifier.load_deals_report()
+    # Load deals, going straight to today's report when find_deals just wrote it
+    todays_report = notifier.base_dir / "output" / f"shopping_report_{datetime.now():%Y%m%d}.md"
+    deals = notifier.load_deals_report(todays_report if todays_report.exists() else None)
     
     if not deals:
         print("No deals report found")
@@ -269,7 +379,8 @@ def main():
     if deals['total_savings'] > 10:
         # Create and send email
         html = notifier.create_html_email(deals)
-        notifier.send_email(html)
+        subject = f"💰 Shopping Deals for {datetime.now():%B %d}"
+        notifier.send_email(html, subject)
         
         # Optional: Send SMS for big savings
         if deals['total_savings'] > 50:
@@ -5,7 +5,7 @@ Syncs shopping lists and deals with Google Sheets
 """
 
 import os
-import json
+import orjson
 import csv
 from datetime import datetime
 from pathlib import Path
@@ -14,6 +14,9 @@ from typing import List, Dict
 # Note: In production, you'd use google-auth and google-api-python-client
 # For now, this is a template showing the structure
 
+# Columns of the "Found Deals" sheet, in order
+_DEAL_FIELDS = ("date", "store", "item", "price", "regular_price", "savings", "valid_until")
+
 class GoogleSheetsIntegration:
     def __init__(self):
         self.base_dir = Path(__file__).parent.parent
@@ -55,50 +58,55 @@ class GoogleSheetsIntegration:
         
         # Save template locally
         template_path = self.base_dir / "output" / "sheets_template.json"
-        with open(template_path, 'w') as f:
-            json.dump(template, f, indent=2)
+        template_path.write_bytes(orjson.dumps(template, option=orjson.OPT_INDENT_2))
         
         return str(template_path)
     
     def export_to_sheets_format(self, deals_data: Dict, route_data: Dict) -> Dict:
         """Convert deal and route data to Google Sheets format"""
-        sheets_data = {
-            "timestamp": datetime.now().isoformat(),
-            "deals": [],
-            "route": [],
-            "summary": {}
-        }
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
         
-        # Format deals for sheets
+        # Format deals for sheets, totalling item savings in the same pass
+        deal_rows = []
+        total_savings = 0.0
         for store, store_deals in deals_data.items():
             for item in store_deals.get('items', []):
-                sheets_data["deals"].append([
-                    datetime.now().strftime('%Y-%m-%d'),
+                savings = item.get('savings', 0)
+                total_savings += savings
+                deal_rows.append([
+                    today,
                     store,
                     item['item'],
                     f"${item['price']:.2f}",
                     f"${item.get('regular_price', item['price']):.2f}",
-                    f"${item.get('savings', 0):.2f}",
+                    f"${savings:.2f}",
                     item.get('valid_until', 'Check store')
                 ])
         
         # Format route for sheets
-        for stop in route_data.get('schedule', []):
-            sheets_data["route"].append([
-                datetime.now().strftime('%Y-%m-%d'),
+        route_rows = [
+            [
+                today,
                 stop['store'],
                 stop['address'],
                 stop['arrival'],
                 stop.get('items_count', 'Multiple'),
                 f"${stop.get('estimated_total', 0):.2f}"
-            ])
-        
-        # Add summary
-        sheets_data["summary"] = {
-            "total_savings": sum(d['savings'] for d in deals_data.values() if 'savings' in d),
-            "stores_to_visit": len(route_data.get('schedule', [])),
-            "estimated_time": route_data.get('total_time', 0),
-            "gas_cost": route_data.get('gas_cost', 0)
+            ]
+            for stop in route_data.get('schedule', [])
+        ]
+        
+        sheets_data = {
+            "timestamp": now.isoformat(),
+            "deals": deal_rows,
+            "route": route_rows,
+            "summary": {
+                "total_savings": total_savings,
+                "stores_to_visit": len(route_rows),
+                "estimated_time": route_data.get('total_time', 0),
+                "gas_cost": route_data.get('gas_cost', 0)
+            }
         }
         
         return sheets_data
@@ -126,11 +134,10 @@ class GoogleSheetsIntegration:
         # For now, save to CSV format that can be imported to Sheets
         output_path = self.base_dir / "output" / f"deals_{datetime.now().strftime('%Y%m%d')}.csv"
         
-        with open(output_path, 'w', newline='') as f:
-            if deals_data:
-                writer = csv.DictWriter(f, fieldnames=deals_data[0].keys())
-                writer.writeheader()
-                writer.writerows(deals_data)
+        with open(output_path, 'w', newline='', buffering=1 << 16) as f:
+            writer = csv.writer(f)
+            writer.writerow(_DEAL_FIELDS)
+            writer.writerows(tuple(deal.get(k, '') for k in _DEAL_FIELDS) for deal in deals_data)
         
         print(f"Deals data saved to {output_path}")
         print("You can import this CSV file into Google Sheets")
@@ -145,31 +152,25 @@ class GoogleSheetsIntegration:
         
         # Create deals CSV
         deals_file = output_dir / f"deals_{timestamp}.csv"
-        with open(deals_file, 'w', newline='') as f:
+        with open(deals_file, 'w', newline='', buffering=1 << 16) as f:
             writer = csv.writer(f)
             writer.writerow(["Store", "Item", "Price", "Savings", "Valid Until"])
-            for deal in report_data.get('deals', []):
-                writer.writerow([
-                    deal.get('store'),
-                    deal.get('item'),
-                    deal.get('price'),
-                    deal.get('savings'),
-                    deal.get('valid_until')
-                ])
+            writer.writerows(
+                (deal.get('store'), deal.get('item'), deal.get('price'),
+                 deal.get('savings'), deal.get('valid_until'))
+                for deal in report_data.get('deals', [])
+            )
         
         # Create route CSV
         route_file = output_dir / f"route_{timestamp}.csv"
-        with open(route_file, 'w', newline='') as f:
+        with open(route_file, 'w', newline='', buffering=1 << 16) as f:
             writer = csv.writer(f)
             writer.writerow(["Stop", "Store", "Address", "Arrival Time", "Items"])
-            for i, stop in enumerate(report_data.get('route', []), 1):
-                writer.writerow([
-                    i,
-                    stop.get('store'),
-                    stop.get('address'),
-                    stop.get('arrival'),
-                    stop.get('items_count')
-                ])
+            writer.writerows(
+                (i, stop.get('store'), stop.get('address'),
+                 stop.get('arrival'), stop.get('items_count'))
+                for i, stop in enumerate(report_data.get('route', []), 1)
+            )
         
         print(f"✅ Google Sheets import files created:")
         print(f"   - Deals: {deals_file}")
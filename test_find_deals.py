@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for matching scraped deals to the shopping list
+"""
+
+import pickle
+
+from find_deals import MilwaukeeDealFinder
+
+def make_finder(items, deals) -> MilwaukeeDealFinder:
+    """Finder with the given list and deals, skipping config and CSV loading"""
+    finder = MilwaukeeDealFinder.__new__(MilwaukeeDealFinder)
+    finder.stores_config = {'settings': {'max_stores_per_trip': 3}}
+    finder.shopping_list = items
+    finder.deals = deals
+    return finder
+
+def item(name: str, max_price: float) -> dict:
+    return {'item': name, 'quantity': 1, 'preferred_brand': '', 'max_price': max_price}
+
+def deal(name: str, price: float, store: str = 'Metro Market') -> dict:
+    return {'item': name, 'price': price, 'store': store}
+
+def test_matches_sorted_by_price_within_budget():
+    finder = make_finder([item('Milk', 4.00)], [
+        deal('Milk', 3.49, 'Metro Market'),
+        deal('Milk', 4.50, 'Sendiks'),
+        deal('Milk', 2.99, 'Walmart')
+    ])
+    
+    matched, route = finder.build_plan()
+    
+    assert [d['store'] for d in matched['Milk']] == ['Walmart', 'Metro Market']
+    assert route['all_store_savings']['Walmart']['total_savings'] == 4.00 - 2.99
+
+def test_deal_price_edited_in_place():
+    milk = deal('Milk', 3.49)
+    finder = make_finder([item('Milk', 4.00)], [milk])
+    assert finder.match_deals_to_list()['Milk'] == [milk]
+    
+    milk['price'] = 99.0
+    
+    matched, route = finder.build_plan()
+    assert matched['Milk'] == []
+    assert route['all_store_savings'] == {}
+
+def test_item_appended_to_shopping_list():
+    finder = make_finder([item('Milk', 4.00)], [deal('Milk', 3.49), deal('Tofu', 2.49)])
+    assert finder.match_deals_to_list() == {'Milk': [finder.deals[0]]}
+    
+    finder.shopping_list.append(item('Tofu', 3.00))
+    
+    assert finder.match_deals_to_list()['Tofu'] == [finder.deals[1]]
+
+def test_pasta_and_pasta_sauce_stay_apart():
+    finder = make_finder([item('Pasta', 2.99), item('Pasta Sauce', 7.99)], [
+        deal('Pasta', 0.98, 'Walmart'),
+        deal('Pasta Sauce', 1.99, 'Cermak Fresh Market')
+    ])
+    
+    matched = finder.match_deals_to_list()
+    
+    assert [d['item'] for d in matched['Pasta']] == ['Pasta']
+    assert [d['item'] for d in matched['Pasta Sauce']] == ['Pasta Sauce']
+
+def test_chicken_breast_does_not_match_chicken_broth():
+    finder = make_finder([item('Chicken Breast', 8.99)], [deal('Chicken Broth', 1.99)])
+    
+    assert finder.match_deals_to_list() == {'Chicken Breast': []}
+
+def test_deal_names_with_extra_or_inflected_words():
+    finder = make_finder([item('Pasta', 2.99), item('Bananas', 2.99)], [
+        deal('Barilla Pasta', 1.49),
+        deal('Banana', 0.39)
+    ])
+    
+    matched = finder.match_deals_to_list()
+    
+    assert [d['item'] for d in matched['Pasta']] == ['Barilla Pasta']
+    assert [d['item'] for d in matched['Bananas']] == ['Banana']
+
+def test_unreadable_cache_falls_back_to_loader(tmp_path, monkeypatch):
+    monkeypatch.setattr(MilwaukeeDealFinder, 'CACHE_DIR', tmp_path / '.cache')
+    source = tmp_path / 'stores_config.json'
+    source.write_text('{}')
+    finder = MilwaukeeDealFinder.__new__(MilwaukeeDealFinder)
+    
+    assert finder._load_cached(source, lambda: {'v': 1}) == {'v': 1}
+    cache_file, = (tmp_path / '.cache').iterdir()
+    cache_file.write_bytes(pickle.dumps({'v': 1})[:5])
+    
+    assert finder._load_cached(source, lambda: {'v': 2}) == {'v': 2}
+    assert finder._load_cached(source, lambda: {'v': 3}) == {'v': 2}
+    assert [p.name for p in (tmp_path / '.cache').iterdir()] == [cache_file.name]
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for the route planner's exact Held-Karp solver
+"""
+
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from route_planner import RouteOptimizer
+
+def round_trip(dist: np.ndarray, order) -> float:
+    """Length of the loop start -> order... -> start"""
+    stops = [0, *order, 0]
+    return sum(dist[a, b] for a, b in zip(stops, stops[1:]))
+
+def brute_force(dist: np.ndarray) -> float:
+    """Shortest round trip by trying every visit order"""
+    n = len(dist) - 1
+    return min(round_trip(dist, order) for order in permutations(range(1, n + 1)))
+
+@pytest.mark.parametrize("n", range(8))
+@pytest.mark.parametrize("seed", range(5))
+def test_held_karp_matches_brute_force(n, seed):
+    # Random points give a symmetric matrix like the haversine one
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 10, size=(n + 1, 2))
+    dist = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+    
+    order = RouteOptimizer._held_karp_order(dist)
+    
+    assert sorted(order) == list(range(1, n + 1))
+    assert round_trip(dist, order) == pytest.approx(brute_force(dist))
+
+@pytest.mark.parametrize("n", range(8))
+def test_held_karp_asymmetric(n):
+    rng = np.random.default_rng(n)
+    dist = rng.uniform(1, 10, size=(n + 1, n + 1))
+    np.fill_diagonal(dist, 0)
+    
+    order = RouteOptimizer._held_karp_order(dist)
+    
+    assert sorted(order) == list(range(1, n + 1))
+    assert round_trip(dist, order) == pytest.approx(brute_force(dist))
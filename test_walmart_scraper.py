@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for parsing live Walmart search and deals pages
+"""
+
+import io
+
+import pytest
+import requests
+
+from walmart_scraper import WalmartScraper, _parse_price
+
+# Three product cards: a plain one, a sale one with a label around the
+# price, and one whose price can't be read
+PAGE = b"""<html><body>
+<div data-item-id="1">
+  <a href="/ip/Great-Value-Whole-Milk/10450114">
+    <span data-automation-id="product-title">Great Value Whole Milk, 1 Gallon</span>
+  </a>
+  <span class="price-main">$3.48</span>
+</div>
+<div data-item-id="2">
+  <a href="/ip/Fresh-Chicken-Breast/19399785">
+    <span data-automation-id="product-title">Fresh Chicken Breast</span>
+  </a>
+  <span class="price-main">Now $3.98/lb</span>
+  <span class="strike-through">$4.98</span>
+</div>
+<div data-item-id="3">
+  <a href="/ip/Mystery-Item/1">
+    <span data-automation-id="product-title">Mystery Item</span>
+  </a>
+  <span class="price-main">See price in cart</span>
+  <span class="strike-through">$9.99</span>
+</div>
+</body></html>"""
+
+@pytest.mark.parametrize("text, expected", [
+    ("$1,234.56", 1234.56),
+    ("Now $3.48", 3.48),
+    ("$1.98/lb", 1.98),
+    ("2.50", 2.50),
+    ("See price in cart", None),
+    ("", None)
+])
+def test_parse_price(text, expected):
+    assert _parse_price(text) == expected
+
+def test_search_results_skip_unreadable_prices():
+    scraper = WalmartScraper(live=True)
+    
+    results = list(scraper._iter_search_results(io.BytesIO(PAGE)))
+    
+    assert results == [
+        {'name': 'Great Value Whole Milk, 1 Gallon', 'price': 3.48,
+         'url': '/ip/Great-Value-Whole-Milk/10450114'},
+        {'name': 'Fresh Chicken Breast', 'price': 3.98,
+         'url': '/ip/Fresh-Chicken-Breast/19399785', 'was_price': 4.98, 'savings': 1.00}
+    ]
+
+def test_category_deals_skip_unreadable_prices():
+    scraper = WalmartScraper(live=True)
+    
+    deals = scraper._parse_category_deals(PAGE)
+    
+    # Only the sale card has both prices; the malformed one is skipped
+    assert deals == [{'item': 'Fresh Chicken Breast', 'price': 3.98, 'savings': 1.00}]
+
+def test_weekly_deals_survive_a_failing_category(monkeypatch):
+    scraper = WalmartScraper(live=True)
+    
+    def fake_get(url, **kwargs):
+        resp = requests.Response()
+        resp.url = url
+        resp.status_code = 503 if url.endswith('/produce') else 200
+        resp._content = PAGE
+        return resp
+    monkeypatch.setattr(scraper, '_get', fake_get)
+    
+    deals = scraper.get_weekly_deals()
+    
+    assert sorted(deal['category'] for deal in deals) == ['dairy-eggs', 'grocery', 'meat-seafood']
@@ -5,20 +5,160 @@ Uses both web scraping and Walmart's search functionality
 """
 
 import requests
-from bs4 import BeautifulSoup
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+from lxml import etree, html as lxml_html
+import re
+import threading
 import time
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from types import MappingProxyType
+from typing import Iterator, List, Dict, Mapping, Optional, Sequence
+from urllib.parse import quote_plus
 from datetime import datetime, timedelta
-import re
+
+# First dollar amount in a price label such as "Now $3.48" or "$1.98/lb"
+_PRICE_RE = re.compile(r'\$\s*(\d[\d,]*(?:\.\d+)?)')
+
+def _parse_price(text: str) -> Optional[float]:
+    """Convert a displayed price like '$1,234.56' to a float, or None if there isn't one"""
+    match = _PRICE_RE.search(text)
+    if match:
+        text = match.group(1)
+    try:
+        return float(text.strip().replace(',', ''))
+    except ValueError:
+        return None
+
+# Mock search results keyed by product keyword, used when not scraping live
+_MOCK_DATA = {
+    'milk': [
+        {
+            'name': 'Great Value Whole Milk, 1 Gallon',
+            'price': 3.48,
+            'unit_price': '$3.48/gal',
+            'in_stock': True,
+            'url': '/ip/Great-Value-Whole-Milk-1-Gallon/10450114',
+            'savings': 0.51,
+            'was_price': 3.99
+        },
+        {
+            'name': 'Great Value 2% Milk, 1 Gallon',
+            'price': 3.48,
+            'unit_price': '$3.48/gal',
+            'in_stock': True,
+            'url': '/ip/Great-Value-2-Milk-1-Gallon/10450115'
+        }
+    ],
+    'bread': [
+        {
+            'name': 'Wonder Bread Classic White, 20 oz',
+            'price': 1.98,
+            'unit_price': '$0.10/oz',
+            'in_stock': True,
+            'url': '/ip/Wonder-Bread-Classic/10403044'
+        },
+        {
+            'name': 'Great Value White Bread, 20 oz',
+            'price': 0.98,
+            'unit_price': '$0.05/oz',
+            'in_stock': True,
+            'url': '/ip/Great-Value-White-Bread/10403045',
+            'savings': 0.50,
+            'was_price': 1.48
+        }
+    ],
+    'eggs': [
+        {
+            'name': 'Great Value Large Eggs, 12 Count',
+            'price': 2.97,
+            'unit_price': '$0.25/egg',
+            'in_stock': True,
+            'url': '/ip/Great-Value-Large-Eggs/10450116'
+        }
+    ],
+    'chicken': [
+        {
+            'name': 'Fresh Chicken Breast, per lb',
+            'price': 3.98,
+            'unit_price': '$3.98/lb',
+            'in_stock': True,
+            'url': '/ip/Fresh-Chicken-Breast/19399785',
+            'savings': 1.00,
+            'was_price': 4.98
+        }
+    ]
+}
+# Every search shares these entries, so freeze them against callers mutating results
+_MOCK_DATA = {key: tuple(map(MappingProxyType, entries)) for key, entries in _MOCK_DATA.items()}
+
+# (time, available, express) for each daily pickup slot: 8 AM - 12 PM with
+# 10 AM mocked as full and express pickup from 11 AM, then 2 PM - 8 PM
+_PICKUP_SLOTS = [
+    (datetime(2000, 1, 1, hour).strftime('%I:%M %p'), hour != 10, hour == 11)
+    for hour in [*range(8, 12), *range(14, 20)]
+]
+
+class _TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second"""
+    
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve the token now (possibly going negative) so concurrent
+            # callers queue up behind each other instead of all waking at once
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        
+        if wait:
+            time.sleep(wait)
 
 class WalmartScraper:
-    def __init__(self):
+    # Compiled once; each product card on search/deal pages is a div[data-item-id]
+    _CARD_XPATH = etree.XPath("//div[@data-item-id]")
+    _NAME_XPATH = etree.XPath("string(.//span[@data-automation-id='product-title'])")
+    _PRICE_XPATH = etree.XPath("string(.//span[contains(@class, 'price-main')])")
+    _WAS_PRICE_XPATH = etree.XPath("string(.//span[contains(@class, 'strike-through')])")
+    _URL_XPATH = etree.XPath("string((.//a/@href)[1])")
+    
+    def __init__(self, live: bool = False, max_per_second: float = 5):
+        # Fetch and parse walmart.com pages instead of returning mock data
+        self.live = live
+        
+        # Stay under Walmart's throttling threshold rather than tripping 429s
+        self._limiter = _TokenBucket(max_per_second)
+        
+        # ACCEPT_ENCODING only advertises brotli when urllib3 can decode it
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Accept-Encoding': ACCEPT_ENCODING,
+            'Connection': 'keep-alive'
         })
         
+        # Keep connections to walmart.com pooled across searches, and retry
+        # throttling/server errors with backoff instead of failing outright
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3,
+                              status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        
         # Walmart store IDs for Milwaukee area
         self.store_ids = {
             'brown_deer': '1872',  # Brown Deer location
@@ -27,25 +167,34 @@ class WalmartScraper:
         
         self.base_url = 'https://www.walmart.com'
         
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """GET a walmart.com URL through the rate limiter"""
+        self._limiter.acquire()
+        return self.session.get(url, timeout=10, **kwargs)
+    
     def search_product(self, product_name: str, max_results: int = 5) -> List[Dict]:
         """Search for a product and get prices"""
         results = []
         
         # Clean product name for search
-        search_query = product_name.replace(' ', '+')
+        search_query = quote_plus(product_name)
         
         # Note: Walmart's actual API requires authentication
         # This is a simplified example structure
         search_url = f"{self.base_url}/search?q={search_query}"
         
         try:
-            # In production, you'd use selenium or playwright for dynamic content
-            # This is a demonstration of the structure
-            
-            # Simulate finding products
-            mock_results = self._get_mock_results(product_name)
+            if self.live:
+                # Stream the page and stop reading once enough cards are parsed
+                with self._get(search_url, stream=True) as resp:
+                    resp.raise_for_status()
+                    resp.raw.decode_content = True
+                    found = list(islice(self._iter_search_results(resp.raw), max_results))
+            else:
+                # Simulate finding products
+                found = self._get_mock_results(product_name)[:max_results]
             
-            for item in mock_results[:max_results]:
+            for item in found:
                 results.append({
                     'name': item['name'],
                     'price': item['price'],
@@ -62,74 +211,46 @@ class WalmartScraper:
         
         return results
     
-    def _get_mock_results(self, product_name: str) -> List[Dict]:
-        """Return mock results for demonstration"""
-        # In production, this would parse actual HTML/JSON from Walmart
+    def _iter_search_results(self, source) -> Iterator[Dict]:
+        """Incrementally parse product cards out of a search results stream"""
+        # Raw bytes let lxml decode once using the page's declared charset
+        for _, card in etree.iterparse(source, events=('end',), tag='div', html=True):
+            if card.get('data-item-id') is None:
+                continue
+            
+            item = self._parse_search_card(card)
+            # Drop the finished card and any already-seen siblings so memory
+            # stays flat however long the page is
+            card.clear()
+            while card.getprevious() is not None:
+                del card.getparent()[0]
+            if item:
+                yield item
+    
+    def _parse_search_card(self, card) -> Optional[Dict]:
+        """Extract a search result from a product card element"""
+        name = self._NAME_XPATH(card).strip()
+        price = _parse_price(self._PRICE_XPATH(card))
+        if not name or price is None:
+            return None
         
-        mock_data = {
-            'milk': [
-                {
-                    'name': 'Great Value Whole Milk, 1 Gallon',
-                    'price': 3.48,
-                    'unit_price': '$3.48/gal',
-                    'in_stock': True,
-                    'url': '/ip/Great-Value-Whole-Milk-1-Gallon/10450114',
-                    'savings': 0.51,
-                    'was_price': 3.99
-                },
-                {
-                    'name': 'Great Value 2% Milk, 1 Gallon',
-                    'price': 3.48,
-                    'unit_price': '$3.48/gal',
-                    'in_stock': True,
-                    'url': '/ip/Great-Value-2-Milk-1-Gallon/10450115'
-                }
-            ],
-            'bread': [
-                {
-                    'name': 'Wonder Bread Classic White, 20 oz',
-                    'price': 1.98,
-                    'unit_price': '$0.10/oz',
-                    'in_stock': True,
-                    'url': '/ip/Wonder-Bread-Classic/10403044'
-                },
-                {
-                    'name': 'Great Value White Bread, 20 oz',
-                    'price': 0.98,
-                    'unit_price': '$0.05/oz',
-                    'in_stock': True,
-                    'url': '/ip/Great-Value-White-Bread/10403045',
-                    'savings': 0.50,
-                    'was_price': 1.48
-                }
-            ],
-            'eggs': [
-                {
-                    'name': 'Great Value Large Eggs, 12 Count',
-                    'price': 2.97,
-                    'unit_price': '$0.25/egg',
-                    'in_stock': True,
-                    'url': '/ip/Great-Value-Large-Eggs/10450116'
-                }
-            ],
-            'chicken': [
-                {
-                    'name': 'Fresh Chicken Breast, per lb',
-                    'price': 3.98,
-                    'unit_price': '$3.98/lb',
-                    'in_stock': True,
-                    'url': '/ip/Fresh-Chicken-Breast/19399785',
-                    'savings': 1.00,
-                    'was_price': 4.98
-                }
-            ]
+        was_price = _parse_price(self._WAS_PRICE_XPATH(card))
+        item = {
+            'name': name,
+            'price': price,
+            'url': self._URL_XPATH(card)
         }
-        
-        # Find best match for product
-        product_lower = product_name.lower()
-        for key in mock_data:
-            if key in product_lower:
-                return mock_data[key]
+        if was_price is not None:
+            item['was_price'] = was_price
+            item['savings'] = round(was_price - price, 2)
+        return item
+    
+    def _get_mock_results(self, product_name: str) -> Sequence[Mapping]:
+        """Return mock results for demonstration"""
+        # In production, this would parse actual HTML/JSON from Walmart
+        key = self._resolve_mock_key(product_name.lower())
+        if key:
+            return _MOCK_DATA[key]
         
         # Default response if no match
         return [{
@@ -137,9 +258,18 @@ class WalmartScraper:
             'price': 4.99,
             'unit_price': '',
             'in_stock': True,
-            'url': '/search?q=' + product_name.replace(' ', '+')
+            'url': '/search?q=' + quote_plus(product_name)
         }]
     
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _resolve_mock_key(product_lower: str) -> Optional[str]:
+        """Find the mock catalog entry whose key appears in the product name"""
+        for key in _MOCK_DATA:
+            if key in product_lower:
+                return key
+        return None
+    
     def get_weekly_deals(self) -> List[Dict]:
         """Get current weekly deals and rollbacks"""
         deals = []
@@ -147,16 +277,60 @@ class WalmartScraper:
         # Categories to check for deals
         categories = ['grocery', 'produce', 'meat-seafood', 'dairy-eggs']
         
-        for category in categories:
-            # In production, scrape actual deals pages
-            category_deals = self._get_category_deals(category)
-            deals.extend(category_deals)
+        # Fetch categories concurrently over the pooled session; the adapter's
+        # pool_maxsize is well above the number of categories
+        with ThreadPoolExecutor(max_workers=len(categories)) as executor:
+            for category_deals in executor.map(self._get_category_deals, categories):
+                deals.extend(category_deals)
         
         return deals
     
     def _get_category_deals(self, category: str) -> List[Dict]:
         """Get deals for a specific category"""
-        # Mock deals data for demonstration
+        if self.live:
+            # A failing category shouldn't cost us the deals from the others
+            try:
+                resp = self._get(f"{self.base_url}/shop/deals/{category}")
+                resp.raise_for_status()
+                deals = self._parse_category_deals(resp.content)
+            except (requests.RequestException, etree.LxmlError) as e:
+                print(f"Error getting {category} deals: {e}")
+                return []
+        else:
+            deals = self._get_mock_category_deals(category)
+        
+        # Add metadata
+        for deal in deals:
+            deal['category'] = category
+            deal['store'] = 'Walmart'
+            deal['valid_until'] = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+            deal['deal_type'] = 'Rollback' if deal['savings'] > 1 else 'Special'
+        
+        return deals
+    
+    def _parse_category_deals(self, content: bytes) -> List[Dict]:
+        """Parse discounted product cards out of a deals page"""
+        doc = lxml_html.fromstring(content)
+        deals = []
+        
+        for card in self._CARD_XPATH(doc):
+            name = self._NAME_XPATH(card).strip()
+            price = _parse_price(self._PRICE_XPATH(card))
+            was_price = _parse_price(self._WAS_PRICE_XPATH(card))
+            # Skip cards with a missing or unreadable price rather than the page
+            if not name or price is None or was_price is None:
+                continue
+            
+            deals.append({
+                'item': name,
+                'price': price,
+                'savings': round(was_price - price, 2)
+            })
+        
+        return deals
+    
+    def _get_mock_category_deals(self, category: str) -> List[Dict]:
+        """Return mock deals for demonstration"""
         mock_deals = {
             'grocery': [
                 {'item': 'Pasta', 'price': 0.98, 'savings': 0.50, 'brand': 'Great Value'},
@@ -177,16 +351,7 @@ class WalmartScraper:
             ]
         }
         
-        deals = mock_deals.get(category, [])
-        
-        # Add metadata
-        for deal in deals:
-            deal['category'] = category
-            deal['store'] = 'Walmart'
-            deal['valid_until'] = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
-            deal['deal_type'] = 'Rollback' if deal['savings'] > 1 else 'Special'
-        
-        return deals
+        return mock_deals.get(category, [])
     
     def check_inventory(self, product_name: str, store_id: str = None) -> Dict:
         """Check if product is in stock at specific store"""
@@ -210,42 +375,22 @@ class WalmartScraper:
         if not store_id:
             store_id = self.store_ids['brown_deer']
         
-        slots = []
-        base_time = datetime.now().replace(minute=0, second=0)
-        
-        # Generate mock pickup slots for next 3 days
-        for day in range(3):
-            date = base_time + timedelta(days=day)
-            
-            # Morning slots (8 AM - 12 PM)
-            for hour in range(8, 12):
-                slot_time = date.replace(hour=hour)
-                slots.append({
-                    'date': slot_time.strftime('%Y-%m-%d'),
-                    'time': slot_time.strftime('%I:%M %p'),
-                    'available': hour != 10,  # Mock 10 AM as unavailable
-                    'express': hour >= 11  # Express pickup after 11 AM
-                })
-            
-            # Afternoon/Evening slots (2 PM - 8 PM)
-            for hour in range(14, 20):
-                slot_time = date.replace(hour=hour)
-                slots.append({
-                    'date': slot_time.strftime('%Y-%m-%d'),
-                    'time': slot_time.strftime('%I:%M %p'),
-                    'available': True,
-                    'express': False
-                })
+        # Mock pickup slots for the next 3 days; format each date only once
+        today = datetime.now()
+        dates = [(today + timedelta(days=day)).strftime('%Y-%m-%d') for day in range(3)]
         
-        return slots
+        return [
+            {'date': date, 'time': time_label, 'available': available, 'express': express}
+            for date in dates
+            for time_label, available, express in _PICKUP_SLOTS
+        ]
     
     def create_shopping_list_url(self, items: List[str]) -> str:
         """Create a Walmart URL with all items in cart"""
-        # Build URL with search parameters
-        base_url = "https://www.walmart.com/search?q="
-        query = "%20OR%20".join([item.replace(' ', '%20') for item in items])
+        # Build URL with search parameters; quote_plus also escapes &, # and +
+        query = "+OR+".join(quote_plus(item) for item in items)
         
-        return base_url + query
+        return f"{self.base_url}/search?q={query}"
 
 def main():
     """Test the Walmart scraper"""